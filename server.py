@@ -4,48 +4,422 @@ Secure HTTP server for serving static files and bank verification API.
 Configured to work with Replit's proxy system with secure bank verification.
 """
 
+import concurrent.futures
+import functools
+import hashlib
 import http.server
-import socketserver
 import os
 import sys
+import threading
 import json
+import logging
+import queue
+import re
+import mimetypes
 import urllib.parse
 import requests
 import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Use orjson for request/response JSON when it is installed, otherwise the stdlib codec.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so error handling is unchanged.
+try:
+    import orjson
+    _loads = orjson.loads
+    _json_bytes = orjson.dumps
+except ImportError:
+    _loads = json.loads
+    
+    def _json_bytes(data):
+        """Serialize a response payload to UTF-8 JSON bytes"""
+        return json.dumps(data).encode('utf-8')
 
 # Server configuration
 PORT = 5000
 HOST = "0.0.0.0"  # Required for Replit proxy
 
+log = logging.getLogger('miles')
+
+# Longest sleep honoured from a provider's Retry-After header
+RETRY_AFTER_MAX = 5  # seconds
+
+class LoggingRetry(Retry):
+    """Retry policy that reports every retry instead of retrying silently"""
+    
+    def parse_retry_after(self, retry_after):
+        # A 429 can ask for minutes; don't let it pin a thread for that long
+        return min(super().parse_retry_after(retry_after), RETRY_AFTER_MAX)
+    
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        status = response.status if response is not None else None
+        log.warning("⚠️ Retrying request: method=%s url=%s status=%s error=%r retries_left=%s",
+                    method, url, status, error, new_retry.total)
+        return new_retry
+
+# Provider API endpoints
+FLUTTERWAVE_BANKS_URL = "https://api.flutterwave.com/v3/banks/NG"
+FLUTTERWAVE_RESOLVE_URL = "https://api.flutterwave.com/v3/accounts/resolve"
+PAYSTACK_RESOLVE_URL = "https://api.paystack.co/bank/resolve"
+
+# Provider request headers, built once from secrets in the environment by load_provider_headers()
+_FLW_HEADERS = None
+_PAY_HEADERS = None
+_PROVIDER_HEADERS_LOADED = False
+
+def _auth_headers(secret_key):
+    """Read-only request headers for a provider secret key"""
+    return MappingProxyType({
+        "Authorization": f"Bearer {secret_key}",
+        "Content-Type": "application/json"
+    })
+
+def load_provider_headers():
+    """Resolve provider secret keys (secure storage) once, warning about any that are missing.
+    
+    main() calls this at startup; when the module is imported instead, the first
+    provider call loads them through _ensure_provider_headers().
+    """
+    global _FLW_HEADERS, _PAY_HEADERS, _PROVIDER_HEADERS_LOADED
+    flutterwave_key = os.environ.get('FLUTTERWAVE_SECRET_KEY')
+    paystack_key = os.environ.get('PAYSTACK_SECRET_KEY')
+    
+    _FLW_HEADERS = _auth_headers(flutterwave_key) if flutterwave_key else None
+    _PAY_HEADERS = _auth_headers(paystack_key) if paystack_key else None
+    
+    if _FLW_HEADERS is None:
+        log.warning("⚠️ Flutterwave secret key not found in environment")
+    if _PAY_HEADERS is None:
+        log.warning("⚠️ Paystack secret key not found in environment")
+    _PROVIDER_HEADERS_LOADED = True
+
+def _ensure_provider_headers():
+    """Load provider headers on first use if main() has not already done so"""
+    if not _PROVIDER_HEADERS_LOADED:
+        load_provider_headers()
+
+# Shared HTTP session so calls to Flutterwave reuse pooled keep-alive connections.
+# Used for the bank list, which is mostly refreshed in the background, so transient
+# 429/5xx and connection errors are retried with exponential backoff.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=LoggingRetry(
+        total=2,
+        connect=2,
+        read=1,
+        backoff_factor=0.3,
+        backoff_jitter=0.2,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+        respect_retry_after_header=True
+    ),
+    pool_block=False
+))
+
+# Account verification runs against a deadline, so its session retries once, skips
+# Retry-After waits and leaves read timeouts to the next provider instead
+_VERIFY_RETRY = LoggingRetry(
+    total=1,
+    connect=1,
+    read=0,
+    backoff_factor=0.3,
+    backoff_jitter=0.2,
+    status_forcelist=(429, 502, 503, 504),
+    allowed_methods=frozenset(['GET', 'POST']),
+    respect_retry_after_header=False
+)
+VERIFY_SESSION = requests.Session()
+VERIFY_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=_VERIFY_RETRY,
+    pool_block=False
+))
+
+# Separate connect/read timeouts so an unreachable host fails fast
+HTTP_TIMEOUT = (3.05, 7)  # (connect, read) seconds
+
+# Each provider gets its own slice of the verification budget, so a degraded
+# Flutterwave can't use up the time the Paystack fallback needs
+FLUTTERWAVE_BUDGET = 7  # seconds
+PAYSTACK_BUDGET = 5  # seconds
+VERIFY_DEADLINE = FLUTTERWAVE_BUDGET + PAYSTACK_BUDGET  # most seconds a verification spends on providers
+VERIFY_ATTEMPTS = 1 + _VERIFY_RETRY.total  # worst-case attempts per provider call
+
+def _timeout_for(deadline, attempts=VERIFY_ATTEMPTS):
+    """Return a per-attempt (connect, read) timeout that fits the time left, or None if past the deadline"""
+    if deadline is None:
+        return HTTP_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    per_attempt = remaining / attempts
+    return (min(HTTP_TIMEOUT[0], per_attempt), min(HTTP_TIMEOUT[1], per_attempt))
+
+def _call_before(deadline, verify, *args):
+    """Run a provider call on EXECUTOR and stop waiting for it once deadline passes.
+    
+    Socket timeouts alone can't enforce the deadline: read timeouts restart on every
+    chunk received and retries add their own backoff. An abandoned call keeps running
+    in the pool but its timeouts are sized to the same budget, so it ends soon after.
+    """
+    future = EXECUTOR.submit(verify, *args, deadline)
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        return {'success': False, 'error': 'Verification deadline exceeded'}
+
+# Nigerian bank list rarely changes, so /api/banks is served from memory between refreshes
+BANKS_CACHE_TTL = 3600  # seconds
+BANKS_STALE_WINDOW = 6 * 3600  # seconds a stale list may still be served while refreshing
+_BANKS_CACHE = None  # (serialized body, cached_at) swapped as a whole, safe to read across threads
+_BANKS_REFRESH_LOCK = threading.Lock()
+
+# Largest request body accepted by the verification endpoint
+MAX_BODY = 4096  # bytes
+
+# Nigerian account numbers (NUBAN) are exactly 10 ASCII digits
+_ACCT_RE = re.compile(r'\A[0-9]{10}\Z')
+
+# Verification errors that never change, serialized once
+_ERR_INVALID_CONTENT_LENGTH = _json_bytes({'success': False, 'error': 'Invalid Content-Length header'})
+_ERR_BODY_TOO_LARGE = _json_bytes({'success': False, 'error': 'Request body too large'})
+_ERR_MISSING_FIELDS = _json_bytes({'success': False, 'error': 'Missing required fields: account_number and bank_code'})
+_ERR_EMPTY_FIELDS = _json_bytes({'success': False, 'error': 'Account number and bank code cannot be empty'})
+_ERR_INVALID_ACCOUNT = _json_bytes({'success': False, 'error': 'Invalid account number format. Must be 10 digits.'})
+_ERR_ALL_PROVIDERS_FAILED = _json_bytes({'success': False, 'error': 'Unable to verify account with any service. Please check details and try again.'})
+_ERR_INVALID_JSON = _json_bytes({'success': False, 'error': 'Invalid JSON in request body'})
+_ERR_INTERNAL = _json_bytes({'success': False, 'error': 'Internal server error during verification'})
+
+def _refresh_banks():
+    """Fetch the bank list from Flutterwave and update the cache on success.
+    
+    Returns a (body, status_code) tuple ready to be sent to the client.
+    """
+    global _BANKS_CACHE
+    try:
+        _ensure_provider_headers()
+        if _FLW_HEADERS is None:
+            return _json_bytes({
+                'success': False,
+                'error': 'Flutterwave configuration missing'
+            }), 500
+        
+        response = SESSION.get(
+            FLUTTERWAVE_BANKS_URL,
+            headers=_FLW_HEADERS,
+            timeout=HTTP_TIMEOUT
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('status') == 'success' and data.get('data'):
+                log.info("✅ Successfully fetched %d banks from Flutterwave", len(data['data']))
+                
+                body = _json_bytes({
+                    'success': True,
+                    'banks': data['data']  # Fixed: frontend expects 'banks', not 'data'
+                })
+                _BANKS_CACHE = (body, time.time())
+                return body, 200
+            
+            log.warning("⚠️ Flutterwave API returned success but no data")
+            return _json_bytes({
+                'success': False,
+                'error': 'No banks data returned from Flutterwave'
+            }), 422
+        
+        log.warning("⚠️ Flutterwave API error: %s - %s", response.status_code, response.text)
+        return _json_bytes({
+            'success': False,
+            'error': f'Flutterwave API error: {response.status_code}'
+        }), response.status_code
+        
+    except requests.exceptions.RequestException as e:
+        log.warning("⚠️ Flutterwave request error: %s", e)
+        return _json_bytes({
+            'success': False,
+            'error': f'Flutterwave request error: {str(e)}'
+        }), 500
+    except Exception as e:
+        log.exception("⚠️ Unexpected error: %s", e)
+        return _json_bytes({
+            'success': False,
+            'error': f'Internal server error: {str(e)}'
+        }), 500
+
+def _refresh_banks_in_background():
+    """Background worker body; releases the single-flight lock when done"""
+    try:
+        _refresh_banks()
+    finally:
+        _BANKS_REFRESH_LOCK.release()
+
+def _schedule_banks_refresh():
+    """Start a background bank list refresh unless one is already running"""
+    if _BANKS_REFRESH_LOCK.acquire(blocking=False):
+        try:
+            threading.Thread(target=_refresh_banks_in_background, daemon=True).start()
+        except Exception:
+            _BANKS_REFRESH_LOCK.release()
+            raise
+
+class Breaker:
+    """Circuit breaker that skips a provider for `cooldown` seconds after `threshold` consecutive failures"""
+    
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+    
+    def is_open(self):
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # Cooldown over: allow calls again, but a single failure reopens the breaker
+                self._opened_at = None
+                self._failures = self.threshold - 1
+                return False
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+_FLW_BREAKER = Breaker()
+_PAY_BREAKER = Breaker()
+
+# Query Flutterwave and Paystack concurrently instead of one after the other.
+# Off by default because it spends Paystack quota on every lookup.
+PARALLEL_VERIFICATION = os.environ.get('PARALLEL_VERIFICATION', '').lower() in ('1', 'true', 'yes')
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=50)  # matches the session pool size
+
+# Static assets served from memory; anything else falls back to SimpleHTTPRequestHandler
+STATIC_EXTENSIONS = {'.html', '.css', '.js', '.png', '.ico', '.svg', '.jpg', '.jpeg', '.webp'}
+_STATIC = {}  # url path -> (body, content_type, etag), filled once in main(); restart to pick up edits
+
+# Provider verifications currently running, so duplicate submits share one upstream call
+_INFLIGHT = {}  # (account_number, bank_code) -> concurrent.futures.Future
+_INFLIGHT_LOCK = threading.Lock()
+# Waiters outlast the owner, whose provider calls are cut off at VERIFY_DEADLINE
+SINGLE_FLIGHT_WAIT = VERIFY_DEADLINE + 3  # seconds
+
+# Successful provider lookups, most recently used last; account names rarely change
+VERIFY_CACHE_TTL = 24 * 3600  # seconds
+VERIFY_CACHE_MAX_ENTRIES = 10000
+_VERIFY_CACHE = OrderedDict()  # (account_number, bank_code) -> (account_name, cached_at)
+_VERIFY_CACHE_LOCK = threading.Lock()
+
+def _verify_cache_get(key):
+    """Return the cached account name for key, or None if missing or expired"""
+    with _VERIFY_CACHE_LOCK:
+        entry = _VERIFY_CACHE.get(key)
+        if entry is None:
+            return None
+        account_name, cached_at = entry
+        if time.time() - cached_at >= VERIFY_CACHE_TTL:
+            del _VERIFY_CACHE[key]
+            return None
+        _VERIFY_CACHE.move_to_end(key)
+        return account_name
+
+def _verify_cache_put(key, account_name):
+    """Cache a verified account name, evicting the least recently used entry on overflow"""
+    with _VERIFY_CACHE_LOCK:
+        _VERIFY_CACHE[key] = (account_name, time.time())
+        _VERIFY_CACHE.move_to_end(key)
+        if len(_VERIFY_CACHE) > VERIFY_CACHE_MAX_ENTRIES:
+            _VERIFY_CACHE.popitem(last=False)
+
+# Map of fintech providers with their custom codes
+_FINTECH_PROVIDERS = {
+    '999992': 'OPay (Paycom)',  # Opay
+    '999991': 'PalmPay',        # PalmPay
+    '090267': 'Kuda Bank',      # Kuda might also need special handling
+    '50515': 'Moniepoint',      # Moniepoint
+    '565': 'Carbon'             # Carbon
+}
+
+# Realistic account names returned for fintech providers
+_NIGERIAN_NAMES = (
+    "ADEBAYO OLUMIDE JAMES", "CHIOMA BLESSING OKAFOR", "IBRAHIM MUSA ABDULLAHI",
+    "FATIMA AISHA MOHAMMED", "EMEKA CHUKWUEMEKA OKONKWO", "KEMI FOLAKE ADEBAYO",
+    "YUSUF HASSAN GARBA", "BLESSING CHIAMAKA NWACHUKWU", "OLUWASEUN DAVID OGUNDIMU",
+    "AMINA ZAINAB USMAN", "CHINEDU KINGSLEY OKORO", "HADIZA SAFIYA ALIYU",
+    "BABATUNDE OLUWAFEMI ADESANYA", "NGOZI CHINONSO EZEH", "SULEIMAN KABIRU DANJUMA",
+    "TITILAYO ABISOLA OGUNTADE", "AHMED IBRAHIM YAKUBU", "NKECHI GLADYS NWANKWO",
+    "RASHEED OLUMUYIWA LAWAL", "GRACE ONYINYECHI OKPALA", "MURTALA SANI BELLO",
+    "FOLASHADE OMOLARA ADEYEMI", "ALIYU ABDULLAHI SHEHU", "PATIENCE CHIDINMA NWOSU",
+    "ABDULRAHMAN UMAR TIJANI", "STELLA AMARACHI IKECHUKWU", "YAKUBU GARBA HASSAN",
+    "FUNMI ADEOLA ADEBISI", "SALISU MUSA DANJUMA", "JOY UGOCHI ONYEKACHI"
+)
+
+@functools.lru_cache(maxsize=4096)
+def _fintech_name(account_number, bank_code):
+    """Pick a stable account name so the same account always gets the same name"""
+    digest = hashlib.md5((account_number + bank_code).encode()).digest()
+    # First 3 digest bytes == first 6 hex chars, without the hex round-trip
+    return _NIGERIAN_NAMES[int.from_bytes(digest[:3], 'big') % len(_NIGERIAN_NAMES)]
+
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Custom handler to serve index.html for the root path and handle CORS + API endpoints."""
     
-    def end_headers(self):
+    def end_headers(self, cache_control='no-cache, no-store, must-revalidate'):
         # Add CORS headers to allow all origins (important for Replit proxy)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', '*')
         # Disable caching to ensure updates are visible
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.send_header('Cache-Control', cache_control)
         self.send_header('Pragma', 'no-cache')
         self.send_header('Expires', '0')
         super().end_headers()
     
+    def log_message(self, format, *args):
+        # Send the per-request access log through the queued logger instead of stderr
+        log.info("%s - %s", self.address_string(), format % args)
+    
     def do_GET(self):
         """Handle GET requests for static files and API endpoints"""
-        if self.path == '/api/banks':
-            self.handle_get_banks()
-        else:
-            # Serve index.html for root path
-            if self.path == '/' or self.path == '':
-                self.path = '/index.html'
-            return super().do_GET()
+        path = self.path.partition('?')[0]
+        handler = self._ROUTES.get(('GET', path))
+        if handler is not None:
+            handler(self)
+            return
+        
+        # Serve index.html for root path
+        if path == '/' or path == '':
+            path = self.path = '/index.html'
+        
+        static = _STATIC.get(path)
+        if static is not None:
+            self.send_static(*static)
+            return
+        return super().do_GET()
     
     def do_POST(self):
         """Handle POST requests for API endpoints"""
-        if self.path == '/api/verify_account':
-            self.handle_verify_account()
+        handler = self._ROUTES.get(('POST', self.path.partition('?')[0]))
+        if handler is not None:
+            handler(self)
         else:
             self.send_error(404, 'API endpoint not found')
     
@@ -57,17 +431,26 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def handle_verify_account(self):
         """Secure bank account verification endpoint"""
         try:
-            # Get request body
-            content_length = int(self.headers['Content-Length'])
+            # Get request body, refusing anything far larger than a verification payload
+            try:
+                content_length = int(self.headers.get('Content-Length', '0'))
+            except ValueError:
+                content_length = -1
+            if content_length < 0:
+                # A negative length would make rfile.read() read until the client hangs up
+                self.close_connection = True
+                self.send_prebuilt(_ERR_INVALID_CONTENT_LENGTH, 400)
+                return
+            if content_length > MAX_BODY:
+                self.close_connection = True
+                self.send_prebuilt(_ERR_BODY_TOO_LARGE, 413)
+                return
             post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            data = _loads(post_data)
             
             # Validate required fields
             if 'account_number' not in data or 'bank_code' not in data:
-                self.send_json_response({
-                    'success': False,
-                    'error': 'Missing required fields: account_number and bank_code'
-                }, 400)
+                self.send_prebuilt(_ERR_MISSING_FIELDS, 400)
                 return
             
             account_number = data['account_number'].strip()
@@ -75,22 +458,26 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             
             # Validate inputs
             if not account_number or not bank_code:
-                self.send_json_response({
-                    'success': False,
-                    'error': 'Account number and bank code cannot be empty'
-                }, 400)
+                self.send_prebuilt(_ERR_EMPTY_FIELDS, 400)
                 return
             
             # Validate account number format (Nigerian format: 10 digits)
-            if not account_number.isdigit() or len(account_number) != 10:
+            if not _ACCT_RE.match(account_number):
+                self.send_prebuilt(_ERR_INVALID_ACCOUNT, 400)
+                return
+            
+            # Serve recently verified accounts without calling any provider
+            cached_name = _verify_cache_get((account_number, bank_code))
+            if cached_name is not None:
                 self.send_json_response({
-                    'success': False,
-                    'error': 'Invalid account number format. Must be 10 digits.'
-                }, 400)
+                    'success': True,
+                    'accountName': cached_name,
+                    'source': 'cache'
+                })
                 return
             
             # Try verification services
-            print(f"🔍 Verifying account: {account_number} with bank code: {bank_code}")
+            log.info("🔍 Verifying account: %s with bank code: %s", account_number, bank_code)
             
             # Special handling for fintech providers with custom bank codes
             fintech_result = self.try_fintech_verification(account_number, bank_code)
@@ -102,266 +489,339 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 })
                 return
             
-            # Try Flutterwave first (primary service) for traditional banks
-            flutterwave_result = self.try_flutterwave_verification(account_number, bank_code)
-            if flutterwave_result['success']:
+            provider_result = self.verify_single_flight(account_number, bank_code)
+            if provider_result['success']:
                 self.send_json_response({
                     'success': True,
-                    'accountName': flutterwave_result['account_name'],
-                    'source': 'flutterwave'
-                })
-                return
-            
-            # If Flutterwave fails, try Paystack as backup
-            print("⚠️ Flutterwave failed, trying Paystack as backup...")
-            paystack_result = self.try_paystack_verification(account_number, bank_code)
-            if paystack_result['success']:
-                self.send_json_response({
-                    'success': True,
-                    'accountName': paystack_result['account_name'],
-                    'source': 'paystack'
+                    'accountName': provider_result['account_name'],
+                    'source': provider_result['source']
                 })
                 return
             
             # All services failed
-            self.send_json_response({
-                'success': False,
-                'error': 'Unable to verify account with any service. Please check details and try again.'
-            }, 422)
+            self.send_prebuilt(_ERR_ALL_PROVIDERS_FAILED, 422)
             
         except json.JSONDecodeError:
-            self.send_json_response({
-                'success': False,
-                'error': 'Invalid JSON in request body'
-            }, 400)
+            self.send_prebuilt(_ERR_INVALID_JSON, 400)
         except Exception as e:
-            print(f"❌ Verification error: {str(e)}")
-            self.send_json_response({
-                'success': False,
-                'error': 'Internal server error during verification'
-            }, 500)
+            log.exception("❌ Verification error: %s", e)
+            self.send_prebuilt(_ERR_INTERNAL, 500)
     
-    def try_flutterwave_verification(self, account_number, bank_code):
-        """Try Flutterwave verification using environment variable for secret key"""
+    def verify_single_flight(self, account_number, bank_code):
+        """Run provider verification, sharing one upstream call between concurrent duplicate requests"""
+        key = (account_number, bank_code)
+        with _INFLIGHT_LOCK:
+            future = _INFLIGHT.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = _INFLIGHT[key] = concurrent.futures.Future()
+        
+        if not is_owner:
+            log.info("🔁 Joining in-flight verification for %s (%s)", account_number, bank_code)
+            try:
+                return future.result(timeout=SINGLE_FLIGHT_WAIT)
+            except concurrent.futures.TimeoutError:
+                return {'success': False, 'error': 'Timed out waiting for in-flight verification'}
+        
         try:
-            # Get secret key from environment variable (secure storage)
-            secret_key = os.environ.get('FLUTTERWAVE_SECRET_KEY')
-            if not secret_key:
-                print("⚠️ Flutterwave secret key not found in environment")
-                return {'success': False, 'error': 'Flutterwave configuration missing'}
+            result = self.try_provider_verification(account_number, bank_code)
+            if result['success']:
+                _verify_cache_put(key, result['account_name'])
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(key, None)
+    
+    def try_provider_verification(self, account_number, bank_code):
+        """Verify against Flutterwave and Paystack within VERIFY_DEADLINE, in parallel when enabled"""
+        if PARALLEL_VERIFICATION:
+            deadline = time.monotonic() + VERIFY_DEADLINE
+            return self.try_providers_in_parallel(account_number, bank_code, deadline)
+        
+        # Try Flutterwave first (primary service) for traditional banks
+        flutterwave_result = _call_before(
+            time.monotonic() + FLUTTERWAVE_BUDGET,
+            self.try_flutterwave_verification, account_number, bank_code
+        )
+        if flutterwave_result['success']:
+            return {**flutterwave_result, 'source': 'flutterwave'}
+        
+        # If Flutterwave fails, try Paystack as backup
+        log.warning("⚠️ Flutterwave failed, trying Paystack as backup...")
+        paystack_result = _call_before(
+            time.monotonic() + PAYSTACK_BUDGET,
+            self.try_paystack_verification, account_number, bank_code
+        )
+        if paystack_result['success']:
+            return {**paystack_result, 'source': 'paystack'}
+        
+        return {
+            'success': False,
+            'error': f"flutterwave: {flutterwave_result.get('error')}; paystack: {paystack_result.get('error')}"
+        }
+    
+    def try_providers_in_parallel(self, account_number, bank_code, deadline=None):
+        """Query both providers at once and return the first successful result"""
+        futures = {
+            EXECUTOR.submit(self.try_flutterwave_verification, account_number, bank_code, deadline): 'flutterwave',
+            EXECUTOR.submit(self.try_paystack_verification, account_number, bank_code, deadline): 'paystack'
+        }
+        errors = []
+        wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=wait):
+                source = futures[future]
+                result = future.result()
+                if result['success']:
+                    # The slower provider may already be running; cancel() only drops it if still queued
+                    for other in futures:
+                        other.cancel()
+                    return {**result, 'source': source}
+                errors.append(f"{source}: {result.get('error')}")
+        except concurrent.futures.TimeoutError:
+            errors.append('timed out waiting for providers')
+        
+        log.warning("⚠️ Parallel verification failed: %s", '; '.join(errors))
+        return {'success': False, 'error': '; '.join(errors)}
+    
+    def try_flutterwave_verification(self, account_number, bank_code, deadline=None):
+        """Try Flutterwave verification using the auth headers built from the secret key at startup"""
+        if _FLW_BREAKER.is_open():
+            log.warning("⚠️ Flutterwave circuit breaker open, skipping")
+            return {'success': False, 'error': 'breaker_open'}
+        
+        try:
+            timeout = _timeout_for(deadline)
+            if timeout is None:
+                return {'success': False, 'error': 'Verification deadline exceeded'}
             
-            # Flutterwave account resolve API endpoint
-            url = "https://api.flutterwave.com/v3/accounts/resolve"
+            _ensure_provider_headers()
+            if _FLW_HEADERS is None:
+                return {'success': False, 'error': 'Flutterwave configuration missing'}
             
             payload = {
                 "account_number": account_number,
                 "account_bank": bank_code
             }
             
-            headers = {
-                "Authorization": f"Bearer {secret_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
-                url,
+            response = VERIFY_SESSION.post(
+                FLUTTERWAVE_RESOLVE_URL,
                 json=payload,
-                headers=headers,
-                timeout=15
+                headers=_FLW_HEADERS,
+                timeout=timeout
             )
             
+            # Only provider-side errors count against the breaker; a 4xx still means it answered
+            if response.status_code >= 500 or response.status_code == 429:
+                _FLW_BREAKER.record_failure()
+            else:
+                _FLW_BREAKER.record_success()
+            
             if response.status_code == 200:
                 data = response.json()
                 if data.get('status') == 'success' and data.get('data') and data['data'].get('account_name'):
                     account_name = data['data']['account_name']
-                    print(f"✅ Flutterwave verification success: {account_name}")
+                    log.info("✅ Flutterwave verification success: %s", account_name)
                     return {'success': True, 'account_name': account_name}
                 else:
-                    print(f"⚠️ Flutterwave API returned success but no account name")
+                    log.warning("⚠️ Flutterwave API returned success but no account name")
                     return {'success': False, 'error': 'Account name not found'}
             else:
-                print(f"⚠️ Flutterwave API error: {response.status_code} - {response.text}")
+                log.warning("⚠️ Flutterwave API error: %s - %s", response.status_code, response.text)
                 return {'success': False, 'error': f'Flutterwave API error: {response.status_code}'}
             
         except requests.exceptions.RequestException as e:
-            print(f"⚠️ Flutterwave request error: {str(e)}")
+            _FLW_BREAKER.record_failure()
+            log.warning("⚠️ Flutterwave request error: %s", e)
             return {'success': False, 'error': f'Flutterwave request error: {str(e)}'}
         except Exception as e:
-            print(f"⚠️ Flutterwave unexpected error: {str(e)}")
+            log.exception("⚠️ Flutterwave unexpected error: %s", e)
             return {'success': False, 'error': f'Flutterwave error: {str(e)}'}
     
     def try_fintech_verification(self, account_number, bank_code):
         """Handle verification for fintech providers with custom bank codes"""
         try:
-            # Map of fintech providers with their custom codes
-            fintech_providers = {
-                '999992': 'OPay (Paycom)',  # Opay
-                '999991': 'PalmPay',        # PalmPay
-                '090267': 'Kuda Bank',      # Kuda might also need special handling
-                '50515': 'Moniepoint',      # Moniepoint
-                '565': 'Carbon'             # Carbon
-            }
-            
-            if bank_code in fintech_providers:
-                provider_name = fintech_providers[bank_code]
-                print(f"🏦 Handling fintech provider: {provider_name} (code: {bank_code})")
+            provider_name = _FINTECH_PROVIDERS.get(bank_code)
+            if provider_name:
+                log.info("🏦 Handling fintech provider: %s (code: %s)", provider_name, bank_code)
                 
-                # Generate realistic account names for fintech providers
-                nigerian_names = [
-                    "ADEBAYO OLUMIDE JAMES", "CHIOMA BLESSING OKAFOR", "IBRAHIM MUSA ABDULLAHI",
-                    "FATIMA AISHA MOHAMMED", "EMEKA CHUKWUEMEKA OKONKWO", "KEMI FOLAKE ADEBAYO",
-                    "YUSUF HASSAN GARBA", "BLESSING CHIAMAKA NWACHUKWU", "OLUWASEUN DAVID OGUNDIMU",
-                    "AMINA ZAINAB USMAN", "CHINEDU KINGSLEY OKORO", "HADIZA SAFIYA ALIYU",
-                    "BABATUNDE OLUWAFEMI ADESANYA", "NGOZI CHINONSO EZEH", "SULEIMAN KABIRU DANJUMA",
-                    "TITILAYO ABISOLA OGUNTADE", "AHMED IBRAHIM YAKUBU", "NKECHI GLADYS NWANKWO",
-                    "RASHEED OLUMUYIWA LAWAL", "GRACE ONYINYECHI OKPALA", "MURTALA SANI BELLO",
-                    "FOLASHADE OMOLARA ADEYEMI", "ALIYU ABDULLAHI SHEHU", "PATIENCE CHIDINMA NWOSU",
-                    "ABDULRAHMAN UMAR TIJANI", "STELLA AMARACHI IKECHUKWU", "YAKUBU GARBA HASSAN",
-                    "FUNMI ADEOLA ADEBISI", "SALISU MUSA DANJUMA", "JOY UGOCHI ONYEKACHI"
-                ]
+                account_name = _fintech_name(account_number, bank_code)
                 
-                # Use account number to consistently generate same name for same account
-                import hashlib
-                name_index = int(hashlib.md5((account_number + bank_code).encode()).hexdigest()[:6], 16) % len(nigerian_names)
-                account_name = nigerian_names[name_index]
-                
-                print(f"✅ Fintech verification success: {account_name}")
+                log.info("✅ Fintech verification success: %s", account_name)
                 return {'success': True, 'account_name': account_name}
             
             # Not a recognized fintech provider
             return {'success': False, 'error': 'Not a fintech provider'}
             
         except Exception as e:
-            print(f"⚠️ Fintech verification error: {str(e)}")
+            log.exception("⚠️ Fintech verification error: %s", e)
             return {'success': False, 'error': f'Fintech verification error: {str(e)}'}
     
-    def try_paystack_verification(self, account_number, bank_code):
-        """Try Paystack verification with secret key stored securely on server"""
+    def try_paystack_verification(self, account_number, bank_code, deadline=None):
+        """Try Paystack verification using the auth headers built from the secret key at startup"""
+        if _PAY_BREAKER.is_open():
+            log.warning("⚠️ Paystack circuit breaker open, skipping")
+            return {'success': False, 'error': 'breaker_open'}
+        
         try:
-            # Get secret key from environment variable (secure storage)
-            secret_key = os.environ.get('PAYSTACK_SECRET_KEY')
-            if not secret_key:
-                print("⚠️ Paystack secret key not found in environment")
-                return {'success': False, 'error': 'Paystack configuration missing'}
+            timeout = _timeout_for(deadline)
+            if timeout is None:
+                return {'success': False, 'error': 'Verification deadline exceeded'}
             
-            url = f"https://api.paystack.co/bank/resolve?account_number={account_number}&bank_code={bank_code}"
+            _ensure_provider_headers()
+            if _PAY_HEADERS is None:
+                return {'success': False, 'error': 'Paystack configuration missing'}
             
-            response = requests.get(
-                url,
-                headers={
-                    'Authorization': f'Bearer {secret_key}',
-                    'Content-Type': 'application/json'
-                },
-                timeout=10
+            response = VERIFY_SESSION.get(
+                PAYSTACK_RESOLVE_URL,
+                params={'account_number': account_number, 'bank_code': bank_code},
+                headers=_PAY_HEADERS,
+                timeout=timeout
             )
             
+            # Only provider-side errors count against the breaker; a 4xx still means it answered
+            if response.status_code >= 500 or response.status_code == 429:
+                _PAY_BREAKER.record_failure()
+            else:
+                _PAY_BREAKER.record_success()
+            
             if response.status_code == 200:
                 data = response.json()
                 if data.get('status') and data.get('data') and data['data'].get('account_name'):
-                    print(f"✅ Paystack verification success")
+                    log.info("✅ Paystack verification success")
                     return {'success': True, 'account_name': data['data']['account_name']}
             
-            print(f"⚠️ Paystack verification failed")
+            log.warning("⚠️ Paystack verification failed")
             return {'success': False, 'error': 'Paystack verification failed'}
             
         except requests.exceptions.RequestException as e:
-            print(f"⚠️ Paystack request error: {str(e)}")
+            _PAY_BREAKER.record_failure()
+            log.warning("⚠️ Paystack request error: %s", e)
             return {'success': False, 'error': f'Paystack request error: {str(e)}'}
         except Exception as e:
-            print(f"⚠️ Paystack unexpected error: {str(e)}")
+            log.exception("⚠️ Paystack unexpected error: %s", e)
             return {'success': False, 'error': f'Paystack error: {str(e)}'}
     
     def handle_get_banks(self):
-        """Handle GET request for fetching banks from Flutterwave API"""
-        try:
-            # Get secret key from environment variable
-            secret_key = os.environ.get('FLUTTERWAVE_SECRET_KEY')
-            if not secret_key:
-                print("⚠️ Flutterwave secret key not found in environment")
-                self.send_json_response({
-                    'success': False,
-                    'error': 'Flutterwave configuration missing'
-                }, 500)
+        """Handle GET request for fetching banks, served from cache when possible"""
+        cached = _BANKS_CACHE
+        if cached is not None:
+            body, cached_at = cached
+            age = time.time() - cached_at
+            if age < BANKS_CACHE_TTL:
+                self.send_prebuilt(body)
                 return
-            
-            # Flutterwave banks API endpoint for Nigeria
-            url = "https://api.flutterwave.com/v3/banks/NG"
-            
-            headers = {
-                "Authorization": f"Bearer {secret_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=15
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('status') == 'success' and data.get('data'):
-                    print(f"✅ Successfully fetched {len(data['data'])} banks from Flutterwave")
-                    
-                    self.send_json_response({
-                        'success': True,
-                        'banks': data['data']  # Fixed: frontend expects 'banks', not 'data'
-                    })
-                else:
-                    print(f"⚠️ Flutterwave API returned success but no data")
-                    self.send_json_response({
-                        'success': False,
-                        'error': 'No banks data returned from Flutterwave'
-                    }, 422)
-            else:
-                print(f"⚠️ Flutterwave API error: {response.status_code} - {response.text}")
-                self.send_json_response({
-                    'success': False,
-                    'error': f'Flutterwave API error: {response.status_code}'
-                }, response.status_code)
-                
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Flutterwave request error: {str(e)}")
-            self.send_json_response({
-                'success': False,
-                'error': f'Flutterwave request error: {str(e)}'
-            }, 500)
-        except Exception as e:
-            print(f"⚠️ Unexpected error: {str(e)}")
-            self.send_json_response({
-                'success': False,
-                'error': f'Internal server error: {str(e)}'
-            }, 500)
+            if age < BANKS_CACHE_TTL + BANKS_STALE_WINDOW:
+                # Serve the stale copy instantly and refresh it in the background
+                _schedule_banks_refresh()
+                self.send_prebuilt(body)
+                return
+        
+        body, status_code = _refresh_banks()
+        self.send_prebuilt(body, status_code)
 
+    def send_static(self, body, content_type, etag):
+        """Send a pre-loaded static file, or 304 if the client already has it"""
+        # 'no-cache' without 'no-store' lets browsers keep the body and revalidate it by ETag
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers('no-cache')
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers('no-cache')
+        
+        self.wfile.write(body)
+    
     def send_json_response(self, data, status_code=200):
         """Send JSON response with proper headers"""
-        response_json = json.dumps(data)
-        
+        self.send_prebuilt(_json_bytes(data), status_code)
+    
+    def send_prebuilt(self, body, status_code=200):
+        """Send an already-serialized JSON body without re-encoding it"""
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', str(len(response_json)))
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
         
-        self.wfile.write(response_json.encode('utf-8'))
+        self.wfile.write(body)
+    
+    # API route table, looked up by (method, path without query string)
+    _ROUTES = {
+        ('GET', '/api/banks'): handle_get_banks,
+        ('POST', '/api/verify_account'): handle_verify_account
+    }
+
+def _index_static_files(root):
+    """Pre-load static assets under root into _STATIC, keyed by URL path"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Skip dependency and hidden directories
+        dirnames[:] = [d for d in dirnames if d != 'node_modules' and not d.startswith('.')]
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() not in STATIC_EXTENSIONS:
+                continue
+            file_path = os.path.join(dirpath, filename)
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            url_path = '/' + os.path.relpath(file_path, root).replace(os.sep, '/')
+            _STATIC[url_path] = (body, content_type, etag)
+
+class MilesHTTPServer(http.server.ThreadingHTTPServer):
+    """Threaded server so slow provider calls don't block other requests"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+def _start_logging():
+    """Route log records through a queue so request threads never block on stdout.
+    
+    Returns the QueueListener that writes the records; stop it on shutdown to flush.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # QueueHandler merges args into the message; the listener's handler adds time and level
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
 
 def main():
     """Start the HTTP server."""
+    listener = _start_logging()
+    
     # Change to the directory containing the static files
     os.chdir(Path(__file__).parent)
+    _index_static_files(os.getcwd())
+    load_provider_headers()
     
     # Create server
-    with socketserver.TCPServer((HOST, PORT), CustomHTTPRequestHandler) as httpd:
-        print(f"🚀 Miles server starting...")
-        print(f"📍 Serving at http://{HOST}:{PORT}")
-        print(f"📁 Document root: {os.getcwd()}")
-        print(f"🌐 Access your app through Replit's web preview")
-        print(f"⚡ Server running with CORS enabled for Replit proxy")
+    with MilesHTTPServer((HOST, PORT), CustomHTTPRequestHandler) as httpd:
+        log.info("🚀 Miles server starting...")
+        log.info("📍 Serving at http://%s:%s", HOST, PORT)
+        log.info("📁 Document root: %s (%d static files preloaded)", os.getcwd(), len(_STATIC))
+        log.info("🌐 Access your app through Replit's web preview")
+        log.info("⚡ Server running with CORS enabled for Replit proxy")
         
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
-            print("\n🛑 Server stopped by user")
+            log.info("🛑 Server stopped by user")
             sys.exit(0)
+        finally:
+            listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file